@@ -1,8 +1,9 @@
 import streamlit as st
 import asyncio
-from main import process_query
+from main import process_query, has_pending_run
 import tempfile
 import time
+import uuid
 
 WELCOME_MESSAGE = """  
 ### 📌 Hi, VME Members!  
@@ -20,7 +21,7 @@ If you're new, follow this **quick guide** to get the best results.
 ### **✅ Best Practices & Tips**  
 ⚡ **Processing time:** 1-2 minutes on average.  
 📄 **Works best on text-heavy PDFs.** The fewer documents & less text, the faster the results.  
-🔄 **If the app crashes**, reload the page & follow the best practices below.  
+🔄 **If the app crashes**, reload the page (the "Resume run ID" field keeps your run's ID) and analyze again to continue where it stopped.  
 🚫 **Avoid number-heavy PDFs** (e.g., financial statements with lots of tables).  
 🚫 **Avoid large-documents** (e.g., documents with page count above 100).  
 📊 **Annual Reports:** To improve accuracy, remove appendices or large data tables before uploading. 
@@ -59,6 +60,9 @@ with st.sidebar:
     # User input query
     query = st.text_area("💬 Enter your query:", max_chars=350)
 
+    # Optional run ID to resume an interrupted analysis (pre-filled from the URL so it survives a reload)
+    resume_run_id = st.text_input("🔁 Resume run ID (optional):", value=st.query_params.get("run_id", "")).strip()
+
     # Analyze button
     analyze_button = st.button("🚀 Analyze Documents")
 
@@ -69,7 +73,29 @@ for message in st.session_state.messages:
 
 # Process query when analyze button is clicked
 if analyze_button:
-    if not uploaded_files:
+    if resume_run_id:
+        st.session_state.messages.append({"role": "user", "content": f"Resuming run `{resume_run_id}`"})
+        with st.chat_message("user"):
+            st.markdown(f"Resuming run `{resume_run_id}`")
+
+        if uploaded_files or query.strip():
+            st.warning("⚠️ Resuming the run ID above, so the uploaded files and query are ignored. Clear the Resume run ID field to start a new analysis.")
+
+        if asyncio.run(has_pending_run(resume_run_id)):
+            try:
+                results = asyncio.run(process_query([], [], "", run_id=resume_run_id))
+                response_text = "\n\n".join(results)
+            finally:
+                # ✅ Don't pre-fill this run ID again, whether the resume finished or failed
+                st.query_params.pop("run_id", None)
+        else:
+            st.query_params.pop("run_id", None)
+            response_text = "⚠️ No interrupted run found for this run ID."
+
+        with st.chat_message("assistant"):
+            st.markdown(response_text)
+        st.session_state.messages.append({"role": "assistant", "content": response_text})
+    elif not uploaded_files:
         st.warning("⚠️ Please upload at least one PDF file.")
     elif not query.strip():
         st.warning("⚠️ Please enter a query.")
@@ -81,16 +107,21 @@ if analyze_button:
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
                 tmp_file.write(uploaded_file.read())
                 pdf_paths.append(tmp_file.name)
-                uploaded_filenames.append(uploaded_file)  # Store file object
+                uploaded_filenames.append(uploaded_file.name)  # Store filename (file objects can't be checkpointed)
 
         # Display user message in chat
         st.session_state.messages.append({"role": "user", "content": query})
         with st.chat_message("user"):
             st.markdown(query)
 
+        # ✅ Keep the run ID in the URL so it survives a reload after a crash
+        run_id = str(uuid.uuid4())
+        st.query_params["run_id"] = run_id
+        st.info(f"🆔 Run ID: `{run_id}`")
+
         # Async function for processing query
         async def process_and_display():
-            results = await process_query(pdf_paths, uploaded_filenames, query)
+            results = await process_query(pdf_paths, uploaded_filenames, query, run_id=run_id)
 
             with st.chat_message("assistant"):
                 response_container = st.empty()
@@ -108,4 +139,5 @@ if analyze_button:
             st.session_state.messages.append({"role": "assistant", "content": response_text})
 
         asyncio.run(process_and_display())
+        st.query_params.pop("run_id", None)  # ✅ Finished, nothing left to resume
 
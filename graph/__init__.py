@@ -1,3 +1,4 @@
-from .nodes import process_input, process_pdf, summarize_page, search_summaries, verify_results
+from .nodes import process_input, process_pdf, deduplicate_pages, summarize_page, search_summaries, verify_results, SUMMARY_ORDER_SEED
 from .state import State
 from .parsers import input_parser, summary_parser, search_result_list_parser
+from .checkpoints import get_checkpointer, page_ledger, usage_ledger
@@ -0,0 +1,138 @@
+import json
+import os
+from typing import Optional
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from utils.logging import summarize_token_usage
+
+# Local SQLite file holding the LangGraph checkpoints, the per-page summary ledger and token usage
+# (kept next to the project root by default, so it doesn't depend on the working directory)
+CHECKPOINT_DB = os.getenv(
+    "CHECKPOINT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checkpoints.sqlite"),
+)
+
+
+def get_checkpointer():
+    """
+    Returns an async context manager yielding a SQLite-backed LangGraph checkpointer.
+    Open it inside the running event loop, e.g. `async with get_checkpointer() as checkpointer:`.
+    """
+    return AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB)
+
+
+class SqliteLedger:
+    """
+    Base for per-run tables stored next to the checkpoints.
+    Uses aiosqlite so waiting on the checkpointer's write lock never blocks the event loop.
+    """
+
+    create_table_sql = ""
+
+    def __init__(self, db_path: str = CHECKPOINT_DB):
+        self.db_path = db_path
+        self._table_ready = False
+
+    async def _connect(self):
+        # Generous timeout: the checkpointer writes to the same file from another connection
+        conn = await aiosqlite.connect(self.db_path, timeout=30)
+        if not self._table_ready:
+            # Created lazily on first use instead of at import time
+            await conn.execute(self.create_table_sql)
+            await conn.commit()
+            self._table_ready = True
+        return conn
+
+
+class PageLedger(SqliteLedger):
+    """
+    Records which pages have already been summarized for a given run ID.
+    Lets `summarize_page` skip finished pages when an interrupted run is resumed.
+    """
+
+    create_table_sql = (
+        "CREATE TABLE IF NOT EXISTS page_summaries ("
+        "run_id TEXT NOT NULL, "
+        "document_name TEXT NOT NULL, "
+        "page_number INTEGER NOT NULL, "
+        "summary TEXT NOT NULL, "
+        "PRIMARY KEY (run_id, document_name, page_number))"
+    )
+
+    async def get(self, run_id: str, document_name: str, page_number: int) -> Optional[dict]:
+        """Returns the recorded summary for a page, or None if it has not been completed yet."""
+        conn = await self._connect()
+        try:
+            async with conn.execute(
+                "SELECT summary FROM page_summaries WHERE run_id = ? AND document_name = ? AND page_number = ?",
+                (run_id, document_name, page_number),
+            ) as cursor:
+                row = await cursor.fetchone()
+        finally:
+            await conn.close()
+        return json.loads(row[0]) if row else None
+
+    async def record(self, run_id: str, document_name: str, page_number: int, summary: dict):
+        """Marks a page as summarized for this run."""
+        conn = await self._connect()
+        try:
+            await conn.execute(
+                "INSERT OR REPLACE INTO page_summaries (run_id, document_name, page_number, summary) VALUES (?, ?, ?, ?)",
+                (run_id, document_name, page_number, json.dumps(summary)),
+            )
+            await conn.commit()
+        finally:
+            await conn.close()
+
+
+class UsageLedger(SqliteLedger):
+    """
+    Accumulates token usage per run and node, one LLM call at a time.
+    Usage is recorded as each call returns, so calls made before a node fails
+    (or before a crash) still show up in the run report.
+    """
+
+    create_table_sql = (
+        "CREATE TABLE IF NOT EXISTS token_usage ("
+        "run_id TEXT NOT NULL, "
+        "node TEXT NOT NULL, "
+        "calls INTEGER NOT NULL, "
+        "input_tokens INTEGER NOT NULL, "
+        "cached_input_tokens INTEGER NOT NULL, "
+        "uncached_input_tokens INTEGER NOT NULL, "
+        "output_tokens INTEGER NOT NULL, "
+        "PRIMARY KEY (run_id, node))"
+    )
+    _columns = ("calls", "input_tokens", "cached_input_tokens", "uncached_input_tokens", "output_tokens")
+
+    async def record(self, run_id: str, node: str, response):
+        """Adds the usage of one LLM response to the node's totals for this run."""
+        usage = summarize_token_usage([response])
+        conn = await self._connect()
+        try:
+            await conn.execute(
+                f"INSERT INTO token_usage (run_id, node, {', '.join(self._columns)}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, node) DO UPDATE SET "
+                + ", ".join(f"{column} = {column} + excluded.{column}" for column in self._columns),
+                (run_id, node, *(usage[column] for column in self._columns)),
+            )
+            await conn.commit()
+        finally:
+            await conn.close()
+
+    async def totals(self, run_id: str) -> dict:
+        """Returns the accumulated usage per node for a run, across resumed attempts."""
+        conn = await self._connect()
+        try:
+            async with conn.execute(
+                f"SELECT node, {', '.join(self._columns)} FROM token_usage WHERE run_id = ?",
+                (run_id,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+        return {row[0]: dict(zip(self._columns, row[1:])) for row in rows}
+
+
+page_ledger = PageLedger()
+usage_ledger = UsageLedger()
@@ -1,16 +1,59 @@
 import asyncio
 import logging
 import random
+from langchain_core.runnables import RunnableConfig
 from tools.llm import llm, llm2
-from tools.tools import pdf_tool, normalizer_tool
+from tools.tools import pdf_tool, normalizer_tool, dedup_tool
 from .parsers import SearchResult, input_parser, summary_parser, search_result_list_parser, verification_parser
 from .state import State
+from .checkpoints import page_ledger, usage_ledger
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-
-async def process_input(state: State):
+# ✅ Static prompt prefixes: instructions and format instructions come first and never change,
+# variable content (query, document, page text) is appended last.
+# OpenAI only caches prefixes of 1024+ tokens, so these short prefixes alone never hit the cache;
+# caching pays off where long shared content follows them: the seeded summary list in the search
+# prompt on reruns, and the page content in verification prompts for claims citing the same page.
+VALIDATION_PROMPT_PREFIX = (
+    "You are an AI input validator. Determine if the user input given at the end is meaningful.\n"
+    "Respond with ONLY `valid` or `gibberish`.\n\n"
+)
+
+SUMMARY_PROMPT_PREFIX = (
+    "You are an advanced document summarizer. Summarize the page content given at the end of this prompt. "
+    "Your summary should have a heading sentence and three key points. "
+    "Ensure that at least one of the points is qualitative and one is quantitative. Each point should reflect "
+    "significant facts or insights and be concise.\n\n"
+    f"{summary_parser.get_format_instructions()}\n\n"
+)
+
+SEARCH_PROMPT_PREFIX = (
+    "You will be given summaries from multiple documents, followed by a query.\n\n"
+    "**Task:** Based on the query, extract the **top 10 most relevant points** while ensuring:\n"
+    "**Fair distribution**: Select points from different documents, avoiding dominance by a single document.\n"
+    "**No duplicates**: If multiple points are highly similar (same meaning, reworded versions), merge them into one.\n"
+    "**Next Best Selection**: If a point is merged due to similarity, select the next most relevant point from the same document.\n\n"
+    "Each extracted point must be associated with **exactly one document name and page number** as its source.\n\n"
+    f"{search_result_list_parser.get_format_instructions()}\n\n"  # This is a PyDantic formatter
+)
+
+VERIFICATION_PROMPT_PREFIX = (
+    "Does the Summary at the end originate from the Page Content before it?\n\n"
+    "Check the following:\n"
+    "- Does the numerical data match exactly?\n"
+    "- Are qualitative descriptions consistent and supported by the content?\n"
+    "- Ensure no hallucination.\n\n"
+    "Respond using valid JSON format:\n"
+    f"{verification_parser.get_format_instructions()}\n\n"
+)
+
+# Default seed for the order summaries are presented to the search LLM (None keeps document/page order)
+SUMMARY_ORDER_SEED = 42
+
+
+async def process_input(state: State, config: RunnableConfig):
     """
     Extracts the query from user input.
     Checks if input is gibberish using LLM before continuing.
@@ -25,13 +68,10 @@ async def process_input(state: State):
         raise ValueError("User query is empty.")
 
     # ✅ Check if input is gibberish using LLM
-    validation_prompt = (
-        f"You are an AI input validator. Determine if the following user input is meaningful:\n\n"
-        f"User Input: \"{user_message}\"\n\n"
-        f"Respond with ONLY `valid` or `gibberish`."
-    )
+    validation_prompt = VALIDATION_PROMPT_PREFIX + f"User Input: \"{user_message}\""
 
     response = await llm.ainvoke([{"role": "user", "content": validation_prompt}])
+    await usage_ledger.record(config["configurable"]["thread_id"], "process_input", response)
     is_valid = "valid" in response.content.lower()
 
     if not is_valid:
@@ -53,8 +93,7 @@ def process_pdf(state: State):
 
     extracted_pages = []
 
-    for pdf_path, uploaded_file in zip(pdf_paths, uploaded_files):
-        document_name = uploaded_file.name
+    for pdf_path, document_name in zip(pdf_paths, uploaded_files):
         # Extract pages
         pdf_result = pdf_tool.invoke({"pdf_path": pdf_path})
         pages = pdf_result.get("pages", [])
@@ -69,44 +108,102 @@ def process_pdf(state: State):
 
     return {"extracted_pages": extracted_pages}
 
-async def summarize_page(state: State):
+def deduplicate_pages(state: State):
+    """
+    Clusters near-duplicate pages within and across documents,
+    so only one representative per cluster gets summarized.
+    """
+    extracted_pages = state.get("extracted_pages")
+
+    if not extracted_pages:
+        raise ValueError("No extracted pages to deduplicate.")
+
+    clusters = dedup_tool.cluster([page["content"] for page in extracted_pages])
+
+    page_clusters = [
+        {
+            "representative": extracted_pages[indices[0]],
+            "members": [
+                {
+                    "document_name": extracted_pages[i]["document_name"],
+                    "page_number": extracted_pages[i]["page_number"],
+                }
+                for i in indices
+            ],
+        }
+        for indices in clusters
+    ]
+
+    logging.info(f"Deduplicated {len(extracted_pages)} pages into {len(page_clusters)} clusters")
+
+    return {"page_clusters": page_clusters}
+
+async def summarize_page(state: State, config: RunnableConfig):
+    run_id = config["configurable"]["thread_id"]
+
     async def summarize(page_data):
         """Helper function to invoke LLM asynchronously for summarization."""
         document_name = page_data["document_name"]  # ✅ Preserve document name
         page_number = page_data["page_number"]
         content = page_data["content"]
 
-        # Define the prompt
-        prompt = (
-            f"You are an advanced document summarizer. Summarize the following content from page {page_number} "
-            f"of the document '{document_name}'. Your summary should have a heading sentence and three key points. "
-            "Ensure that at least one of the points is qualitative and one is quantitative. Each point should reflect "
-            "significant facts or insights and be concise.\n\n"
-            f'"{content}"\n\n'
-            f"{summary_parser.get_format_instructions()}"
+        # ✅ Skip pages already completed by an earlier attempt of this run
+        completed = await page_ledger.get(run_id, document_name, page_number)
+        if completed:
+            return completed
+
+        # Define the prompt (static prefix, page-specific suffix)
+        prompt = SUMMARY_PROMPT_PREFIX + (
+            f"Document: '{document_name}'\n"
+            f"Page: {page_number}\n\n"
+            f'"{content}"'
         )
 
         # Invoke the LLM and parse the response
         response = await llm.ainvoke([{"role": "user", "content": prompt}])
+        await usage_ledger.record(run_id, "summarize_page", response)
         parsed_summary = summary_parser.parse(response.content)
 
         # ✅ Return with `document_name` included
-        return {
+        summary = {
             "document_name": document_name,  # ✅ Fix: Preserve document name
             "page_number": parsed_summary.page_number,
             "heading_sentence": parsed_summary.heading_sentence,
             "key_points": parsed_summary.key_points,
         }
 
-    # Summarize all pages concurrently
-    tasks = [summarize(page_data) for page_data in state["extracted_pages"]]
-    summarized_pages = await asyncio.gather(*tasks)
+        # ✅ Record page completion so a resumed run does not summarize it again
+        await page_ledger.record(run_id, document_name, page_number, summary)
+        return summary
+
+    # Summarize one representative per cluster concurrently
+    page_clusters = state["page_clusters"]
+    tasks = [summarize(cluster["representative"]) for cluster in page_clusters]
+    representative_summaries = await asyncio.gather(*tasks)
+
+    # ✅ Map each summary back to every member page so sources stay citable
+    summarized_pages = [
+        {**summary, "document_name": member["document_name"], "page_number": member["page_number"], "cluster_id": cluster_id}
+        for cluster_id, (cluster, summary) in enumerate(zip(page_clusters, representative_summaries))
+        for member in cluster["members"]
+    ]
 
     # logging.info(f"Summarized Pages: {summarized_pages}")
 
     return {"summarized_pages": summarized_pages}
 
-async def search_summaries(state: State):
+def order_summaries(summaries: list, seed=SUMMARY_ORDER_SEED) -> list:
+    """
+    Returns summaries in a reproducible order: sorted by document and page,
+    then shuffled with a fixed seed so no document always comes first.
+    Pass `seed=None` to keep the plain document/page order.
+    """
+    ordered = sorted(summaries, key=lambda summary: (summary["document_name"], summary["page_number"]))
+    if seed is not None:
+        random.Random(seed).shuffle(ordered)
+    return ordered
+
+async def search_summaries(state: State, config: RunnableConfig):
     query = state.get("query")
     summaries = state.get("summarized_pages")
 
@@ -114,36 +211,48 @@ async def search_summaries(state: State):
         raise ValueError("Query not found.")
     if not summaries:
         raise ValueError("Summaries not found.")
-    
-    random.shuffle(summaries)
+
+    # ✅ Show each near-duplicate cluster once, under its representative (first) page
+    clusters = {}
+    for summary in summaries:
+        clusters.setdefault(summary["cluster_id"], []).append(summary)
+
+    # ✅ Deterministic ordering keeps the prompt identical across reruns of the same inputs
+    unique_summaries = order_summaries(
+        [members[0] for members in clusters.values()],
+        state.get("summary_order_seed", SUMMARY_ORDER_SEED),
+    )
+
+    def also_on(summary):
+        duplicates = clusters[summary["cluster_id"]][1:]
+        if not duplicates:
+            return ""
+        # Only the representative is citable: the summary was written from its text
+        return f" (near-duplicate content also on {len(duplicates)} other page(s); cite this page)"
 
     # ✅ Ensure document names are included in the summaries
     concatenated_summaries = "\n\n".join(
-        f"📄 **Document: {summary['document_name']}** | Page {summary['page_number']}:\n"
+        f"📄 **Document: {summary['document_name']}** | Page {summary['page_number']}{also_on(summary)}:\n"
         f"- **Heading Sentence**: {summary['heading_sentence']}\n"
         f"- **Key Points**:\n"
         f"  1. {summary['key_points'][0]}\n"
         f"  2. {summary['key_points'][1]}\n"
         f"  3. {summary['key_points'][2]}"
-        for summary in summaries
+        for summary in unique_summaries
     )
 
     # Define the search prompt
-    search_prompt = (
-        f"The following are summaries from multiple documents:\n\n"
+    search_prompt = SEARCH_PROMPT_PREFIX + (
+        f"Summaries:\n\n"
         f"{concatenated_summaries}\n\n"
-        f"**Task:** Based on the query: \"{query}\", extract the **top 10 most relevant points** while ensuring:\n"
-        f"**Fair distribution**: Select points from different documents, avoiding dominance by a single document.\n"
-        f"**No duplicates**: If multiple points are highly similar (same meaning, reworded versions), merge them into one.\n"
-        f"**Next Best Selection**: If a point is merged due to similarity, select the next most relevant point from the same document.\n\n"
-        f"Each extracted point must be associated with **exactly one document name and page number** as its source.\n\n"
-        f"{search_result_list_parser.get_format_instructions()}" # This is a PyDantic formatter
+        f"Query: \"{query}\""
     )
 
     logging.info(f"Search Prompt: {search_prompt}\n\n\n\n\n")
 
     # Use the LLM to perform the search
     response = await llm.ainvoke([{"role": "user", "content": search_prompt}])
+    await usage_ledger.record(config["configurable"]["thread_id"], "search_summaries", response)
     
     # It only returns points from the frist document on the list
     logging.info(f"Search summary response: {response}\n\n\n\n\n")
@@ -155,9 +264,16 @@ async def search_summaries(state: State):
         # ✅ Attach the correct `document_name` to each search result
         enriched_results = []
         for result in parsed_results.results:
+            # ✅ Match on document and page, since documents share page numbers
             matching_summary = next(
-                (s for s in summaries if s["page_number"] == result.claimed_page), None
+                (s for s in summaries if (s["document_name"], s["page_number"]) == (result.document_name, result.claimed_page)),
+                None,
             )
+            if not matching_summary:
+                # Fall back to the page number alone if the LLM garbled the document name
+                matching_summary = next(
+                    (s for s in summaries if s["page_number"] == result.claimed_page), None
+                )
             if matching_summary:
                 result_data = {
                     "document_name": matching_summary["document_name"],  # ✅ Add document name
@@ -174,7 +290,7 @@ async def search_summaries(state: State):
         print(f"Error parsing search results: {e}")
         raise ValueError("Failed to parse search results.")
 
-async def verify_results(state: State):
+async def verify_results(state: State, config: RunnableConfig):
     search_results = state.get("search_results", [])
     extracted_pages = state.get("extracted_pages", [])
 
@@ -185,6 +301,8 @@ async def verify_results(state: State):
     if not extracted_pages:
         raise ValueError("No extracted pages to verify against.")
 
+    run_id = config["configurable"]["thread_id"]
+
     async def verify(result):
         document_name = result["document_name"]  # ✅ Access `document_name`
         claimed_page = result["claimed_page"]
@@ -200,20 +318,16 @@ async def verify_results(state: State):
 
         raw_content = normalizer_tool.normalize(matching_page["content"])
         # Define the verification prompt
-        verification_prompt = (
-            f"Does the following summary originate from the content of Page {claimed_page} in the document '{document_name}'?\n\n"
-            f"Summary:\n{content}\n\n"
+        # Page content goes before the claim so claims citing the same page share a cacheable prefix
+        verification_prompt = VERIFICATION_PROMPT_PREFIX + (
+            f"Document: '{document_name}'\n\n"
             f"Page {claimed_page} Content:\n{raw_content}\n\n"
-            f"Check the following:\n"
-            f"- Does the numerical data match exactly?\n"
-            f"- Are qualitative descriptions consistent and supported by the content?\n"
-            f"- Ensure no hallucination.\n\n"
-            f"Respond using valid JSON format:\n"
-            f"{verification_parser.get_format_instructions()}"
+            f"Summary:\n{content}"
         )
 
         # Call the LLM for verification
         response = await llm.ainvoke([{"role": "user", "content": verification_prompt}])
+        await usage_ledger.record(run_id, "verify_results", response)
 
         try:
             # Parse the verification response
@@ -230,9 +344,22 @@ async def verify_results(state: State):
             print(f"Error parsing verification result for {document_name} Page {claimed_page}: {e}")
         return None
 
-    # Verify all search results asynchronously
-    tasks = [verify(result) for result in search_results]
-    all_verified_points = await asyncio.gather(*tasks)
+    # Group results citing the same page, so they can reuse that page's cached prompt prefix
+    page_groups = {}
+    for index, result in enumerate(search_results):
+        page_groups.setdefault((result["document_name"], result["claimed_page"]), []).append(index)
+
+    all_verified_points = [None] * len(search_results)
+
+    async def verify_group(indices):
+        # The first claim warms the provider's prefix cache for this page, the rest follow concurrently
+        all_verified_points[indices[0]] = await verify(search_results[indices[0]])
+        rest = await asyncio.gather(*(verify(search_results[i]) for i in indices[1:]))
+        for i, point in zip(indices[1:], rest):
+            all_verified_points[i] = point
+
+    # Verify all pages asynchronously
+    await asyncio.gather(*(verify_group(indices) for indices in page_groups.values()))
 
     logging.info(f"Post-verify: {all_verified_points}\n\n\n\n\n")
 
@@ -1,4 +1,4 @@
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from typing_extensions import TypedDict
 from .parsers import PageSummary, SearchResult, VerificationResult
 from langgraph.graph.message import add_messages
@@ -10,6 +10,8 @@ class State(TypedDict):
     uploaded_files: List[str]
     query: str
     extracted_pages: List[dict]
+    page_clusters: List[dict]
     summarized_pages: List[PageSummary]
     search_results: List[SearchResult]
     verified_results: List[VerificationResult]
+    summary_order_seed: Optional[int]
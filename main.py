@@ -1,9 +1,11 @@
 import asyncio
 import logging
-from graph import process_input, process_pdf, summarize_page, search_summaries, verify_results
-from graph import State
+import uuid
+from graph import process_input, process_pdf, deduplicate_pages, summarize_page, search_summaries, verify_results, SUMMARY_ORDER_SEED
+from graph import State, get_checkpointer, usage_ledger
 from tools import llm, pdf_tool
 from langgraph.graph import StateGraph, START, END
+from utils.logging import log_token_usage
 
 def route_based_on_input(state: State) -> str:
     if state.get("input_valid"):
@@ -18,52 +20,89 @@ graph_builder = StateGraph(State)
 # Add nodes to the graph
 graph_builder.add_node("process_input", process_input)
 graph_builder.add_node("process_pdf", process_pdf)
+graph_builder.add_node("deduplicate_pages", deduplicate_pages)
 graph_builder.add_node("summarize_page", summarize_page)
 graph_builder.add_node("search_summaries", search_summaries)
 graph_builder.add_node("verify_results", verify_results)
 
 graph_builder.add_edge(START, "process_input")
 graph_builder.add_conditional_edges("process_input", route_based_on_input)
-graph_builder.add_edge("process_pdf", "summarize_page")
+graph_builder.add_edge("process_pdf", "deduplicate_pages")
+graph_builder.add_edge("deduplicate_pages", "summarize_page")
 graph_builder.add_edge("summarize_page", "search_summaries")
 graph_builder.add_edge("search_summaries", "verify_results")
 graph_builder.add_edge("verify_results", END)
 
-# Compile the graph
-graph = graph_builder.compile()
-
 # ✅ **Updated Function to Handle Multiple PDFs**
-async def process_query(pdf_paths: list, uploaded_filenames: list[str], user_query: str):
-    """Handles the processing of multiple PDF files with a user query."""
-    """Handles the processing of multiple PDF files with their original filenames."""
+async def process_query(pdf_paths: list, uploaded_filenames: list[str], user_query: str, run_id: str = None, summary_order_seed: int = SUMMARY_ORDER_SEED):
+    """
+    Handles the processing of multiple PDF files with their original filenames.
+    If `run_id` points to an interrupted run, resumes it from its last checkpoint instead of starting over.
+    `summary_order_seed` fixes the order summaries are shown to the search LLM (None keeps document/page order).
+    """
+    run_id = run_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": run_id}}
+
+    async with get_checkpointer() as checkpointer:
+        # Compile the graph with the persistent checkpointer
+        graph = graph_builder.compile(checkpointer=checkpointer)
+
+        # ✅ Resume if this run ID has a checkpoint with nodes still pending
+        snapshot = await graph.aget_state(config)
+        if snapshot.next:
+            logging.info(f"Resuming run {run_id} at {snapshot.next}")
+            graph_input = None
+        elif snapshot.values:
+            # Finished runs are not restarted: their page ledger would leak into the new run
+            raise ValueError(f"Run {run_id} has already finished. Start a new run instead.")
+        else:
+            graph_input = build_initial_state(pdf_paths, uploaded_filenames, user_query, summary_order_seed)
+
+        results = []
+        try:
+            async for event in graph.astream(graph_input, config):
+                for value in event.values():
+                    if isinstance(value, dict) and "messages" in value:
+                        last_message = value["messages"][-1]
+                        if isinstance(last_message, dict) and "content" in last_message:
+                            results.append(last_message["content"])
+        finally:
+            # ✅ Report cached vs uncached input tokens per node for this run, including failed runs
+            for node, usage in (await usage_ledger.totals(run_id)).items():
+                log_token_usage(node, usage)
+
+    logging.info(f"Final result ({run_id}): {results}\n\n\n\n\n")
+    return results
+
+
+async def has_pending_run(run_id: str) -> bool:
+    """Checks whether `run_id` has a checkpoint with nodes still pending, i.e. can be resumed."""
+    async with get_checkpointer() as checkpointer:
+        graph = graph_builder.compile(checkpointer=checkpointer)
+        snapshot = await graph.aget_state({"configurable": {"thread_id": run_id}})
+    return bool(snapshot.next)
+
+
+def build_initial_state(pdf_paths: list, uploaded_filenames: list[str], user_query: str, summary_order_seed: int = SUMMARY_ORDER_SEED) -> dict:
+    """Builds the starting state for a fresh run."""
     if not pdf_paths or not isinstance(pdf_paths, list):
         raise ValueError("No PDF paths provided.")
     if not uploaded_filenames or not isinstance(uploaded_filenames, list):
         raise ValueError("No uploaded filenames provided.")
 
-    initial_state = {
+    return {
         "messages": [{"role": "user", "content": user_query}],
         "pdf_paths": pdf_paths,  # ✅ Updated to accept a list of PDF paths
         "uploaded_files": uploaded_filenames,
         "query": user_query,
         "extracted_pages": [],
+        "page_clusters": [],
         "summarized_pages": [],
         "search_results": [],
         "verified_results": [],
+        "summary_order_seed": summary_order_seed,
     }
 
-    results = []
-    async for event in graph.astream(initial_state):
-        for value in event.values():
-            if "messages" in value:
-                last_message = value["messages"][-1]
-                if isinstance(last_message, dict) and "content" in last_message:
-                    results.append(last_message["content"])
-
-
-    logging.info(f"Final result: {results}\n\n\n\n\n")
-    return results
-
 
 # If running as a standalone script (for testing without Streamlit)
 if __name__ == "__main__":
@@ -75,8 +114,9 @@ if __name__ == "__main__":
                 break
 
             # Run asynchronously in CLI
-            pdf_paths = input("Enter PDF file paths (comma-separated): ").split(",")
-            results = asyncio.run(process_query(pdf_paths, user_input))
+            pdf_paths = [path.strip() for path in input("Enter PDF file paths (comma-separated): ").split(",")]
+            run_id = input("Run ID to resume (leave empty for a new run): ").strip() or None
+            results = asyncio.run(process_query(pdf_paths, pdf_paths, user_input, run_id))
 
             for res in results:
                 print(f"Assistant: {res}")
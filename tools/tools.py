@@ -5,7 +5,7 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
-import pdfplumber, re
+import pdfplumber, re, hashlib, random
 
 
 # Define input schema for the tool
@@ -190,7 +190,114 @@ class TextNormalizer:
 
         return text.strip()
 
+class PageDeduplicator:
+    """
+    Groups near-duplicate pages (disclaimers, section dividers, repeated headers)
+    using MinHash signatures over word shingles.
+    Pages are compared within and across documents; LSH banding keeps the
+    comparison close to linear in the number of pages.
+    Pages only cluster if they also contain exactly the same figures, so a member
+    page never inherits numbers from its representative's summary.
+    """
+
+    _MERSENNE_PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, threshold: float = 0.9, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        # Fixed seed so signatures (and therefore clusters) are reproducible across runs
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, self._MERSENNE_PRIME), rng.randrange(0, self._MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set:
+        """
+        Splits normalized text into overlapping word shingles.
+        Pages shorter than one shingle are kept as a single shingle.
+        """
+        tokens = re.findall(r"\w+", text.lower())
+        if len(tokens) <= self.shingle_size:
+            return {" ".join(tokens)}
+        return {
+            " ".join(tokens[i:i + self.shingle_size])
+            for i in range(len(tokens) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> List[int]:
+        """Computes the MinHash signature of a page."""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in self.shingles(text)
+        ]
+        return [
+            min((a * h + b) % self._MERSENNE_PRIME for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def figures(self, text: str) -> List[str]:
+        """Extracts the numeric tokens of a page, in order."""
+        return re.findall(r"\d[\d.,]*", text)
+
+    def similarity(self, sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimates the Jaccard similarity of two pages from their signatures."""
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / self.num_perm
+
+    def cluster(self, texts: List[str]) -> List[List[int]]:
+        """
+        Clusters texts whose estimated similarity reaches the threshold
+        and whose figures are identical.
+
+        Args:
+            texts (List[str]): Page contents, in extraction order.
+
+        Returns:
+            List[List[int]]: Clusters of indices into `texts`. Each cluster is sorted and
+            clusters are ordered by their first index, so the first member is the representative.
+        """
+        signatures = [self.signature(text) for text in texts]
+        figures = [self.figures(text) for text in texts]
+        parent = list(range(len(texts)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # Candidate pairs share at least one identical band
+        rows = self.num_perm // self.bands
+        buckets: Dict[tuple, List[int]] = {}
+        for index, sig in enumerate(signatures):
+            for band in range(self.bands):
+                key = (band, tuple(sig[band * rows:(band + 1) * rows]))
+                buckets.setdefault(key, []).append(index)
+
+        for members in buckets.values():
+            for pos, first in enumerate(members):
+                for other in members[pos + 1:]:
+                    root_a, root_b = find(first), find(other)
+                    if (
+                        root_a != root_b
+                        and figures[first] == figures[other]
+                        and self.similarity(signatures[first], signatures[other]) >= self.threshold
+                    ):
+                        # Keep the earliest page as root so it becomes the representative
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        clusters: Dict[int, List[int]] = {}
+        for index in range(len(texts)):
+            clusters.setdefault(find(index), []).append(index)
+        return list(clusters.values())
+
 normalizer_tool = TextNormalizer()
+dedup_tool = PageDeduplicator()
 pdf_tool = PDFPlumberTool()
 
 
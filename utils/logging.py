@@ -1,2 +1,37 @@
+import logging
+
+
 def log_event(event):
     print(f"Event: {event}")
+
+
+def summarize_token_usage(responses) -> dict:
+    """
+    Adds up input, cached and output tokens over a node's LLM responses.
+    Cached tokens are the part of the input served from the provider's prompt prefix cache.
+    """
+    usage = {"calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "uncached_input_tokens": 0, "output_tokens": 0}
+
+    for response in responses:
+        metadata = getattr(response, "usage_metadata", None) or {}
+        input_tokens = metadata.get("input_tokens", 0)
+        cached_tokens = (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+        usage["calls"] += 1
+        usage["input_tokens"] += input_tokens
+        usage["cached_input_tokens"] += cached_tokens
+        usage["uncached_input_tokens"] += input_tokens - cached_tokens
+        usage["output_tokens"] += metadata.get("output_tokens", 0)
+
+    return usage
+
+
+def log_token_usage(node: str, usage: dict):
+    """Logs a node's cached vs uncached input tokens."""
+    cached_ratio = usage["cached_input_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0
+    logging.info(
+        f"Token usage [{node}]: {usage['calls']} calls, "
+        f"{usage['input_tokens']} input ({usage['cached_input_tokens']} cached / "
+        f"{usage['uncached_input_tokens']} uncached, {cached_ratio:.0%} cache hit), "
+        f"{usage['output_tokens']} output"
+    )